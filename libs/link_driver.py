@@ -17,12 +17,21 @@ import sys
 import os
 import time
 import fcntl
+import threading
 import traceback
+try:
+	import Queue as queue
+except ImportError:
+	import queue
 
 # hardcoded values and return code types
 from link_settings import LINKRESET
 # a python logging tool
 from link_logger import link_logger	
+
+# Block size and number of buffers used by the streaming transfers
+STREAM_BLOCKSIZE = 4096
+STREAM_DEPTH = 2
 	
 class Link():
 	""" A class which interacts with the Linux device-driver for INMOS B004 
@@ -32,6 +41,7 @@ class Link():
 	device = False
 	config = False
 	buf = []
+	throughput = 0.0
 
 	def __init__(self, link_config):
 		self.config = link_config
@@ -82,7 +92,22 @@ class Link():
 			print("Error reading %s bytes from Transputer link device %s:" % (count, self.config["link_device"]))
 			traceback.print_exc(file=sys.stdout)
 			return False
-	
+
+	def ReadLinkRaw(self, count):
+		""" As ReadLink, but return the bytes exactly as they came back
+		from the driver rather than copying them into self.buf. """
+		try:
+			if self.device:
+				self.logger.debug("Reading %s raw bytes from %s" % (count, self.config["link_device"]))
+				return os.read(self.device, count)
+			else:
+				self.logger.warn("Transputer link device %s is not open" % self.config["link_device"])
+				return False
+		except Exception as e:
+			print("Error reading %s bytes from Transputer link device %s:" % (count, self.config["link_device"]))
+			traceback.print_exc(file=sys.stdout)
+			return False
+
 	def WriteLink(self, bytes, count):
 		try:
 			if self.device:
@@ -102,6 +127,138 @@ class Link():
 			traceback.print_exc(file=sys.stdout)
 			return False
 	
+	def StreamWriteLink(self, buffers, blocksize = STREAM_BLOCKSIZE, depth = STREAM_DEPTH):
+		""" Write everything from an iterable of buffers (strings, bytearrays,
+		lists of byte values...) to the link. Data is copied into a small
+		pool of reusable blocks which a background thread writes out, so
+		the caller can be reading the next buffer from disk, or generating
+		it, while the previous one is still going down the link.
+		
+		Returns the number of bytes written, or False if a write failed.
+		The achieved rate in bytes per second is left in self.throughput. """
+		
+		if not self.device:
+			self.logger.warn("Transputer link device %s is not open" % self.config["link_device"])
+			return False
+		
+		free = queue.Queue()
+		full = queue.Queue(depth)
+		for i in range(0, depth):
+			free.put(bytearray(blocksize))
+		state = { 'written' : 0, 'error' : False }
+		
+		def writer():
+			while True:
+				block, length = full.get()
+				if block is None:
+					return
+				if not state['error']:
+					try:
+						written = os.write(self.device, memoryview(block)[0:length])
+						state['written'] += written
+						if written != length:
+							self.logger.fatal("Short write of %s/%s bytes to Transputer link device %s" % (written, length, self.config["link_device"]))
+							state['error'] = True
+					except Exception as e:
+						self.logger.fatal("Error writing %s bytes to Transputer link device %s:" % (length, self.config["link_device"]))
+						traceback.print_exc(file=sys.stdout)
+						state['error'] = True
+				free.put(block)
+		
+		start = time.time()
+		thread = threading.Thread(target = writer)
+		thread.daemon = True
+		thread.start()
+		try:
+			for data in buffers:
+				if not isinstance(data, (bytearray, memoryview)):
+					data = bytearray(data)
+				data = memoryview(data)
+				i = 0
+				while (i < len(data)) and not state['error']:
+					block = free.get()
+					length = min(blocksize, len(data) - i)
+					block[0:length] = data[i:i + length]
+					full.put((block, length))
+					i += length
+				if state['error']:
+					break
+		finally:
+			full.put((None, 0))
+			thread.join()
+		
+		elapsed = time.time() - start
+		if elapsed > 0:
+			self.throughput = state['written'] / elapsed
+		self.logger.debug("Streamed %s bytes to %s at %.0f bytes/sec" % (state['written'], self.config["link_device"], self.throughput))
+		if state['error']:
+			return False
+		return state['written']
+	
+	def StreamReadLink(self, count, blocksize = STREAM_BLOCKSIZE, depth = STREAM_DEPTH):
+		""" Generator which reads 'count' bytes from the link in blocks,
+		yielding each one as a memoryview. A background thread keeps
+		reading into a small pool of reusable blocks while the caller
+		works on the previous one; each view is only valid until the
+		next one is asked for.
+		
+		Stops early if the link times out or fails. The achieved rate
+		in bytes per second is left in self.throughput. """
+		
+		if not self.device:
+			self.logger.warn("Transputer link device %s is not open" % self.config["link_device"])
+			return
+		
+		free = queue.Queue()
+		full = queue.Queue(depth)
+		for i in range(0, depth):
+			free.put(bytearray(blocksize))
+		state = { 'stop' : False }
+		
+		def reader():
+			to_go = count
+			while (to_go > 0) and not state['stop']:
+				block = free.get()
+				try:
+					data = os.read(self.device, min(blocksize, to_go))
+				except Exception as e:
+					self.logger.fatal("Error reading from Transputer link device %s:" % (self.config["link_device"]))
+					traceback.print_exc(file=sys.stdout)
+					data = b""
+				if not data:
+					break
+				block[0:len(data)] = data
+				full.put((block, len(data)))
+				to_go -= len(data)
+			full.put((None, 0))
+		
+		start = time.time()
+		total = 0
+		thread = threading.Thread(target = reader)
+		thread.daemon = True
+		thread.start()
+		try:
+			while True:
+				block, length = full.get()
+				if block is None:
+					break
+				total += length
+				yield memoryview(block)[0:length]
+				free.put(block)
+		finally:
+			# Let the reader thread finish if the caller gave up early
+			state['stop'] = True
+			free.put(bytearray(blocksize))
+			while thread.is_alive():
+				try:
+					full.get(timeout = 0.1)
+				except queue.Empty:
+					pass
+			elapsed = time.time() - start
+			if elapsed > 0:
+				self.throughput = total / elapsed
+			self.logger.debug("Streamed %s bytes from %s at %.0f bytes/sec" % (total, self.config["link_device"], self.throughput))
+	
 	def ResetLink(self):
 		try:
 			if self.device:
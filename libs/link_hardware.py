@@ -34,4 +34,30 @@ TAG_LSPEED = 9
 TAG_BOOT = 2
 TAG_TEST16 = 3
 TAG_TEST32 = 4
-TAG_HALT = 255
\ No newline at end of file
+TAG_HALT = 255
+
+# Printable names for the model types above
+NAMES = {
+	UNKNOWN : "Unknown",
+	HALF : "Half",
+	DISK : "Disk",
+	HOST_TAG : "Host",
+	TXXX : "TXXX",
+	BAD16 : "Bad16",
+	BAD32 : "Bad32",
+	T16 : "T16",
+	T32 : "T32",
+	C4 : "C004",
+	M212 : "M212",
+	T_212 : "T212",
+	T_414 : "T414",
+	T414B : "T414B",
+	T_800 : "T800",
+	T800C : "T800C",
+	T800D : "T800D",
+	T_425 : "T425",
+	T_805 : "T805",
+	T_801 : "T801",
+	T_225 : "T225",
+	T_400 : "T400",
+}
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+##################################################
+#
+# A read-ahead framing layer which sits on top of
+# a link_driver Link object.
+#
+# Replies from the iserver code running on a
+# Transputer are a 2 byte little-endian length
+# followed by that many bytes of payload. Rather
+# than issue one read for the length and another
+# for the payload (or one read per byte), we read
+# as much as we can in one go into a fixed buffer
+# and hand back frames as views into that buffer.
+#
+# By John Snowdon (john.snowdon@newcastle.ac.uk) 2016
+#
+##################################################
+
+# python modules
+import struct
+
+# a python logging tool
+from link_logger import link_logger
+
+# Default size of the read-ahead buffer - comfortably
+# larger than the biggest iserver reply plus header.
+READAHEAD_SIZE = 4096
+
+# Size of the little-endian length word ahead of each frame
+FRAME_HEADER = 2
+
+class LinkReader():
+	""" Buffered reader for a Link. Bytes are read in as large a block as
+	the caller expects into a fixed size buffer, and length-prefixed
+	iserver frames are parsed out of it as memoryview objects.
+
+	Views returned by read_frame() point directly into the
+	internal buffer and are only valid until the next call which reads
+	from the link - copy them (bytearray(view)) if they need to live
+	longer. """
+
+	def __init__(self, link, size = READAHEAD_SIZE):
+		self.link = link
+		self.buf = bytearray(size)
+		self.view = memoryview(self.buf)
+		self.start = 0
+		self.end = 0
+		self.reads = 0
+		self.dropped = 0
+		if self.link.config["device_verbose"]:
+			self.logger = link_logger(__name__, 'DEBUG')
+		else:
+			self.logger = link_logger(__name__, 'WARN')
+
+	def available(self):
+		""" Number of bytes buffered but not yet consumed. """
+		return self.end - self.start
+
+	def reset(self):
+		""" Throw away anything buffered, e.g. after resetting the network. """
+		self.start = 0
+		self.end = 0
+
+	def compact(self):
+		""" Move any unconsumed bytes back to the start of the buffer so
+		that the free space at the end is as large as possible. The
+		buffer is never resized, so outstanding views stay valid
+		objects, although their contents will have moved. """
+
+		if self.start == 0:
+			return
+		pending = self.end - self.start
+		if pending:
+			self.buf[0:pending] = self.buf[self.start:self.end]
+		self.start = 0
+		self.end = pending
+
+	def fill(self, want = 1):
+		""" Issue a single read to the link asking for at least 'want' more
+		bytes. Returns the number of bytes actually read, which may be
+		less than requested if the driver timed out, or a negative
+		value / False on error. """
+
+		if (len(self.buf) - self.end) < want:
+			self.compact()
+		want = min(want, len(self.buf) - self.end)
+		if want <= 0:
+			self.logger.warn("Read-ahead buffer full (%s bytes)" % len(self.buf))
+			return 0
+
+		data = self.link.ReadLinkRaw(count = want)
+		self.reads += 1
+		if data is False:
+			return False
+		count = len(data)
+		if count:
+			self.buf[self.end:self.end + count] = data
+			self.end += count
+		self.logger.debug("fill(want = %s) read %s bytes, %s buffered" % (want, count, self.available()))
+		return count
+
+	def ensure(self, count = 0, retries = 10):
+		""" Make sure at least 'count' bytes are buffered, reading from the
+		link no more than 'retries' times. Returns True if they are. """
+
+		while (self.available() < count) and (retries > 0):
+			result = self.fill(want = count - self.available())
+			if (result is False) or (result < 0):
+				return False
+			retries -= 1
+		return self.available() >= count
+
+	def read(self, count = 0, retries = 10):
+		""" Return a view of up to 'count' raw bytes, reading the whole
+		amount from the link in one go where possible. """
+
+		self.ensure(count = count, retries = retries)
+		count = min(count, self.available())
+		data = self.view[self.start:self.start + count]
+		self.start += count
+		return data
+
+	def discard(self, count = 0, retries = 10):
+		""" Read and throw away the next 'count' bytes, however many of
+		them are already buffered. Used to step over a frame nobody wants,
+		so it can't block every read after it. Anything which still
+		hasn't arrived after 'retries' reads is given up on and the
+		buffer emptied. """
+
+		while count > 0:
+			if self.available() == 0:
+				if retries <= 0:
+					self.logger.warn("discard: %s bytes never arrived" % count)
+					break
+				result = self.fill(want = min(count, len(self.buf)))
+				if (result is False) or (result < 0):
+					break
+				retries -= 1
+				continue
+			skip = min(count, self.available())
+			self.start += skip
+			count -= skip
+		if self.available() == 0:
+			self.reset()
+
+	def peek_length(self):
+		""" Length of the next frame in the buffer, or None if the
+		length word has not arrived yet. """
+
+		if self.available() < FRAME_HEADER:
+			return None
+		return struct.unpack_from("<H", self.buf, self.start)[0]
+
+	def read_frame(self, maxlength = 0, retries = 10, expect = None):
+		""" Read one length-prefixed iserver frame. The header and the
+		expected payload (maxlength bytes, unless 'expect' says otherwise)
+		are asked for in a single read, so a well behaved reply costs one
+		trip through the driver. Pass a smaller 'expect' where frames vary
+		in size, so the read doesn't sit waiting for bytes that aren't
+		coming.
+
+		Returns a memoryview of the payload (possibly empty), or None if
+		the frame did not arrive or was longer than maxlength. A frame
+		longer than maxlength is read and thrown away, and counted in
+		self.dropped. """
+
+		if self.available() < FRAME_HEADER:
+			# Ask for the header and the expected payload at once
+			if expect is None:
+				expect = maxlength
+			self.fill(want = FRAME_HEADER + expect - self.available())
+		if not self.ensure(count = FRAME_HEADER, retries = retries):
+			self.logger.debug("read_frame: no frame header (%s bytes buffered)" % self.available())
+			return None
+
+		length = self.peek_length()
+		if length > maxlength:
+			self.logger.warn("read_frame: discarding frame of %s bytes, exceeds maximum of %s" % (length, maxlength))
+			self.discard(count = FRAME_HEADER + length, retries = retries)
+			self.dropped += 1
+			return None
+
+		if not self.ensure(count = FRAME_HEADER + length, retries = retries):
+			self.logger.warn("read_frame: short frame, wanted %s got %s bytes" % (length, self.available() - FRAME_HEADER))
+			return None
+
+		first = self.start + FRAME_HEADER
+		self.start = first + length
+		return self.view[first:self.start]
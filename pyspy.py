@@ -1,9 +1,17 @@
 #!/usr/bin/env python
 
 import sys
+import os
 import getopt
 from libs.link_driver import Link
-from pyspy.check import Check
+from pyspy.check import Check, DETAILS, DETAIL_FULL
+from pyspy.output import JsonLinesOutput, DotOutput
+from pyspy.watch import Watch, SCAN_EVERY
+from pyspy.boot import NetworkLoader
+from pyspy.server import HostServer
+from pyspy.compare import Compare
+from pyspy.selftest import SelfTest
+from pyspy.calibrate import Calibrate, load_calibration
 
 PROGRAM_NAME="pyspy"
 VERSION_NUMBER=0.1
@@ -19,6 +27,19 @@ CONFIG = {
 	'verbose' : False,
 	'vverbose' : False,
 	'device_verbose' : False,
+	'output_json' : False,
+	'output_dot' : False,
+	'detail' : DETAIL_FULL,
+	'watch' : 0,
+	'watch_scan' : SCAN_EVERY,
+	'boot_file' : False,
+	'loader_file' : False,
+	'serve' : False,
+	'compare_file' : False,
+	'compare_quick' : False,
+	'test_file' : False,
+	'calibration_file' : False,
+	'calibrate' : False,
 }
 
 def help():
@@ -38,13 +59,26 @@ def help():
 	print(" --v       :  verbose mode")
 	print(" --vv      :  extra verbose mode")	
 	print(" --d 	   :  show device driver calls")
+	print(" --detail=<l>: what to report per processor: %s (default %s)" % (", ".join(DETAILS), DETAIL_FULL))
+	print(" --watch=<s>: re-probe every <s> seconds and report changes")
+	print(" --ws=<n>  :  with --watch, look for new processors every <n> passes (default %s, 0 never)" % SCAN_EVERY)
+	print(" --boot=<f>:  after mapping, broadcast boot <f> on every processor")
+	print(" --test=<f>:  after mapping, run test kernel <f> on every processor")
+	print(" --loader=<f>: resident loader boot file used by --boot and --test")
+	print(" --s       :  act as host file server for the running program")
+	print(" --cmp=<f> :  compare the network with a map saved by --json")
+	print(" --cq      :  with --cmp, stop at the first difference")
+	print(" --cal=<f> :  use the link calibration saved in <f>")
+	print(" --calibrate: calibrate every route, saving to the --cal file")
+	print(" --json    :  stream results as JSON lines while scanning")
+	print(" --dot=<f> :  write the network map as Graphviz DOT to <f>")
 	print(" --h       :  This help page\n")
 	print("v%s" % VERSION_NUMBER)
 
 
 def __main__():
 	try:                                
-		opts, args = getopt.getopt(sys.argv[1:], "nrlivhd", ["vv", "d", "i", "v", "r", "n", "c4", "cl", "cr", "cs", "l="])
+		opts, args = getopt.getopt(sys.argv[1:], "nrlivhd", ["vv", "d", "i", "v", "r", "n", "c4", "cl", "cr", "cs", "l=", "json", "dot=", "detail=", "watch=", "ws=", "boot=", "loader=", "s", "cmp=", "cq", "test=", "cal=", "calibrate"])
 	except getopt.GetoptError:
 		help()
 		sys.exit(2)
@@ -73,18 +107,122 @@ def __main__():
 			CONFIG["C004_long_read"] = True
 		elif o in ["--cr", "-cr"]:
 			CONFIG["C004_reset"] = True
+		elif o in ["--detail"]:
+			if a not in DETAILS:
+				help()
+				sys.exit(2)
+			CONFIG["detail"] = a
+		elif o in ["--watch"]:
+			try:
+				CONFIG["watch"] = float(a)
+			except ValueError:
+				help()
+				sys.exit(2)
+		elif o in ["--ws"]:
+			try:
+				CONFIG["watch_scan"] = int(a)
+			except ValueError:
+				help()
+				sys.exit(2)
+		elif o in ["--boot"]:
+			CONFIG["boot_file"] = a
+		elif o in ["--test"]:
+			CONFIG["test_file"] = a
+		elif o in ["--loader"]:
+			CONFIG["loader_file"] = a
+		elif o in ["--s"]:
+			CONFIG["serve"] = True
+		elif o in ["--cmp"]:
+			CONFIG["compare_file"] = a
+		elif o in ["--cq"]:
+			CONFIG["compare_quick"] = True
+		elif o in ["--cal"]:
+			CONFIG["calibration_file"] = a
+		elif o in ["--calibrate"]:
+			CONFIG["calibrate"] = True
+		elif o in ["--json"]:
+			CONFIG["output_json"] = True
+		elif o in ["--dot"]:
+			CONFIG["output_dot"] = a
 		elif o in ["--h", "--help", "-h", "-help"]:
 			help()
 			sys.exit()
 	
+	if (CONFIG["boot_file"] or CONFIG["test_file"]) and not CONFIG["loader_file"]:
+		print("--boot and --test need a resident loader, given with --loader")
+		sys.exit(2)
+	
 	# Create a new Link driver
 	l = Link(CONFIG)
-	print("%s v%s" % (PROGRAM_NAME, VERSION_NUMBER))	
-	if l.OpenLink():
+	if not CONFIG["output_json"]:
+		# Keep stdout clean for the JSON stream
+		print("%s v%s" % (PROGRAM_NAME, VERSION_NUMBER))	
+	if l.OpenLink() and CONFIG["serve"] and not CONFIG["boot_file"]:
+		# Program already running - just answer its requests
+		status = HostServer(l).serve()
+		l.CloseLink()
+		sys.exit(status)
+	elif l.device:
 		linkchecker = Check(l)
+		if CONFIG["compare_file"]:
+			try:
+				reference = Compare(CONFIG["compare_file"])
+			except (EnvironmentError, ValueError, KeyError) as e:
+				print("Unable to read reference map %s: %s" % (CONFIG["compare_file"], e))
+				l.CloseLink()
+				sys.exit(2)
+			if CONFIG["compare_quick"]:
+				linkchecker.until = reference.until
+		if CONFIG["calibration_file"] and not CONFIG["calibrate"] and os.path.exists(CONFIG["calibration_file"]):
+			try:
+				linkchecker.segsizes = load_calibration(CONFIG["calibration_file"])
+			except (EnvironmentError, ValueError, KeyError) as e:
+				print("Unable to read link calibration %s: %s" % (CONFIG["calibration_file"], e))
+				l.CloseLink()
+				sys.exit(2)
+		if CONFIG["output_json"]:
+			linkchecker.outputs.append(JsonLinesOutput(sys.stdout))
+		if CONFIG["output_dot"]:
+			dotfile = open(CONFIG["output_dot"], "w")
+			linkchecker.outputs.append(DotOutput(dotfile))
 		linkchecker.check()
+		if CONFIG["output_dot"]:
+			dotfile.close()
+			linkchecker.outputs.pop()
+		if CONFIG["calibrate"]:
+			calibration = Calibrate(linkchecker)
+			if calibration.run() is False:
+				print("Unable to calibrate with this resident code")
+			else:
+				calibration.report()
+				if CONFIG["calibration_file"]:
+					calibration.save(CONFIG["calibration_file"])
+		if CONFIG["compare_file"] and not reference.report(linkchecker.processors):
+			l.CloseLink()
+			sys.exit(1)
+		if CONFIG["boot_file"]:
+			# The loaded program replaces the iserver, so there
+			# is nothing left to watch afterwards
+			if not NetworkLoader(linkchecker, loader = CONFIG["loader_file"]).load(CONFIG["boot_file"]):
+				l.CloseLink()
+				sys.exit(2)
+			if CONFIG["serve"]:
+				status = HostServer(l).serve()
+				l.CloseLink()
+				sys.exit(status)
+		elif CONFIG["test_file"]:
+			selftest = SelfTest(linkchecker, loader = CONFIG["loader_file"])
+			passed = selftest.run(CONFIG["test_file"])
+			selftest.report()
+			if not passed:
+				l.CloseLink()
+				sys.exit(1)
+		elif CONFIG["watch"]:
+			try:
+				Watch(linkchecker, scan = CONFIG["watch_scan"]).run(interval = CONFIG["watch"])
+			except KeyboardInterrupt:
+				pass
 		#linkchecker.c4()
-		#linkchecker.compare()
 		#linkchecker.display()
 	else:
 		print("Unable to continue")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+################################################################
+#
+# boot.py: Loads a user program on to every processor of a
+# network which has been mapped by check.py.
+#
+# Rather than push the whole image down each route in turn, the
+# host sends it exactly once, to the root. A small resident loader
+# on each processor copies itself, then the image, out of every
+# link leading further down the spanning tree found by the worm,
+# so the time taken grows with the depth of the tree rather than
+# the number of processors.
+#
+# The resident loader is a transputer boot file supplied by the
+# user. On booting it expects, from its boot link:
+#
+#	tree record:	1 byte mask of the links to forward on, then
+#			for each of those links in ascending order a
+#			2 byte little-endian length and the tree record
+#			for the processor on that link.
+#	image:		4 byte little-endian length and 2 byte segment
+#			size, then the image as a run of segments.
+#	segment:	4 byte index, 2 byte length, the data, then a 2
+#			byte CRC-16/CCITT (initial value 0xFFFF) of the
+#			data.
+#	end of round:	a segment header with index 0xFFFFFFFF and
+#			length 0.
+#
+# At the end of each round the loader replies with an iserver frame
+# (2 byte length, then 4 byte indexes) listing the segments whose
+# CRC did not match, and the host sends just those again. An empty
+# list means the image is complete. Each loader checks the segments
+# it forwards the same way with its own children, resending from its
+# copy, so the host only ever deals with the root.
+#
+# It sends its own boot code, then each child's tree record, out of
+# the links in its mask, forwards the image to the same links as it
+# arrives, and finally runs the image.
+#
+# by John Snowdon (John.Snowdon@newcastle.ac.uk) 2016.
+#
+###############################################################
+
+# Basic Python modules
+import os
+import mmap
+import struct
+import binascii
+
+from libs.link_driver import STREAM_BLOCKSIZE
+from libs.link_reader import LinkReader, FRAME_HEADER
+
+# Index which marks the end of a round of segments
+SEGMENT_END = 0xFFFFFFFF
+
+# Rounds of resends before giving up
+LOAD_RETRIES = 5
+
+def checksum(data = None):
+	""" CRC-16/CCITT of a segment - binascii does this from a lookup
+	table in C, much faster than doing it here byte by byte. """
+	return binascii.crc_hqx(data, 0xFFFF)
+
+###############################################################
+
+class NetworkLoader():
+	""" Broadcast boot of a single program to every processor found by a
+	Check instance, fanning out along the spanning tree the worm used. """
+
+	def __init__(self, checker = None, loader = None):
+		self.checker = checker
+		self.link = checker.link
+		self.logger = checker.logger
+		self.loader = loader
+
+	def tree(self, processor = None):
+		""" Build the tree record telling the resident loader on the root
+		processor, and everything beneath it, where to forward to. Records
+		are built deepest first from Check.treeorder(), so no recursion is
+		needed however long the chains in the network are. """
+		records = {}
+		for p in reversed(self.checker.treeorder()):
+			mask = 0
+			record = bytearray()
+			for (linkno, q) in self.checker.children(processor = p):
+				mask |= (1 << linkno)
+				child = records.pop(q.tpid)
+				record += struct.pack("<H", len(child))
+				record += child
+			records[p.tpid] = bytearray([ mask ]) + record
+		return records[processor.tpid]
+
+	def segments(self, image = None, indexes = None, segsize = 0):
+		""" Frame the given segments of a mapped image, each with its
+		index, length and CRC, for the link to stream. """
+		for index in indexes:
+			data = image[index * segsize:(index + 1) * segsize]
+			yield bytearray(struct.pack("<IH", index, len(data))) + data + bytearray(struct.pack("<H", checksum(data)))
+		yield bytearray(struct.pack("<IH", SEGMENT_END, 0))
+
+	def load(self, filename = None):
+		""" Reset the network and broadcast boot the program in 'filename'.
+		Returns True if everything was sent to the root processor. """
+
+		if not self.checker.processors:
+			self.logger.fatal("No processors found to load %s on to" % filename)
+			return False
+
+		root = self.checker.processors[0]
+		tree = self.tree(processor = root)
+		self.logger.info("Tree record for %s processors is %s bytes" % (len(self.checker.processors), len(tree)))
+
+		try:
+			f = open(self.loader, "rb")
+			try:
+				loader = f.read()
+			finally:
+				f.close()
+			f = open(filename, "rb")
+		except EnvironmentError as e:
+			self.logger.fatal("Unable to open boot files %s, %s: %s" % (self.loader, filename, e))
+			return False
+
+		try:
+			size = os.fstat(f.fileno()).st_size
+			if size == 0:
+				self.logger.fatal("Boot file %s is empty" % filename)
+				return False
+			try:
+				image = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+			except (ValueError, mmap.error, EnvironmentError) as e:
+				self.logger.fatal("Unable to map boot file %s: %s" % (filename, e))
+				return False
+			try:
+				return self.send(filename = filename, loader = loader, tree = tree, image = image, size = size)
+			finally:
+				image.close()
+		finally:
+			f.close()
+
+	def send(self, filename = None, loader = None, tree = None, image = None, size = 0):
+		""" Reset the network and push the resident loader, tree record
+		and image to the root processor, resending bad segments until the
+		root reports the image complete. """
+
+		root = self.checker.processors[0]
+
+		# Everything is still running the iserver code left by the worm,
+		# so it has to be reset whatever the scan was told to do
+		self.checker.reset(force = True)
+
+		self.logger.info("Sending resident loader (%s bytes)" % len(loader))
+		if self.link.WriteLink(bytes = bytearray(loader), count = len(loader)) != len(loader):
+			self.logger.fatal("Unable to send resident loader to root processor")
+			return False
+		self.link.Wait()
+
+		if self.link.WriteLink(bytes = tree, count = len(tree)) != len(tree):
+			self.logger.fatal("Unable to send tree record to root processor")
+			return False
+
+		segsize = self.checker.segsize(root)
+		count = (size + segsize - 1) // segsize
+		header = bytearray(struct.pack("<IH", size, segsize))
+		if self.link.WriteLink(bytes = header, count = len(header)) != len(header):
+			self.logger.fatal("Unable to send image header to root processor")
+			return False
+
+		reader = LinkReader(self.link, size = FRAME_HEADER + (4 * count))
+		pending = range(0, count)
+		for attempt in range(0, LOAD_RETRIES):
+			if self.link.StreamWriteLink(self.segments(image = image, indexes = pending, segsize = segsize), blocksize = STREAM_BLOCKSIZE) is False:
+				self.logger.fatal("Failed sending %s to root processor" % filename)
+				return False
+			self.logger.info("Sent %s segments of %s at %.0f bytes/sec" % (len(pending), filename, self.link.throughput))
+
+			frame = reader.read_frame(maxlength = 4 * count, expect = 0)
+			if frame is None:
+				self.logger.fatal("No segment check from root processor")
+				return False
+			pending = [ struct.unpack_from("<I", frame, i)[0] for i in range(0, len(frame) - 3, 4) ]
+			pending = [ index for index in pending if index < count ]
+			if not pending:
+				return True
+			self.logger.warn("Resending %s of %s segments of %s" % (len(pending), count, filename))
+
+		self.logger.fatal("%s segments of %s still bad after %s attempts" % (len(pending), filename, LOAD_RETRIES))
+		return False
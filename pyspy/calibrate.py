@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+################################################################
+#
+# calibrate.py: Finds the largest transfer each route through
+# the network will carry without errors, and saves the results
+# so that later loads can use them.
+#
+# Transputer link rates are fixed by the LinkSpeed pins rather
+# than by software, so what is tuned here is the size of each
+# segment sent down a route: every processor is sent echo tests
+# of increasing size, each one checked byte for byte, and of the
+# sizes which always came back intact the one giving the highest
+# rate is kept, along with that rate and the speed getstats
+# measured. SEGSIZE is the most the iserver code takes in one
+# packet, so a route can only be given a smaller segment than the
+# default, where that turns out faster or the default is
+# unreliable. A route which fails even the smallest size is saved
+# as failed, and left to the default when the calibration is
+# loaded.
+#
+# The tests need resident code which echoes back a whole
+# TAG_TEST16 / TAG_TEST32 frame of up to SEGSIZE bytes. The
+# built-in iserver code is only known to echo its 2 or 4 byte
+# word (see Check.ping), so the root is checked first and nothing
+# is calibrated if it won't echo a longer frame.
+#
+# by John Snowdon (John.Snowdon@newcastle.ac.uk) 2016.
+#
+###############################################################
+
+# Basic Python modules
+import json
+
+# more defines about particular hardware types
+import libs.link_hardware as link_hardware
+from pyspy.check import SEGSIZE
+from pyspy.compare import routename
+
+###############################################################
+
+# Segment sizes tried on each route, smallest first
+SEGMENT_SIZES = [ 32, 64, 128, 256, SEGSIZE ]
+
+# Echo tests at each size which must all succeed
+CALIBRATE_PASSES = 4
+
+def pattern(size = 0, seed = 0):
+	""" Test data which exercises every byte value and plenty of bit
+	transitions, different on every pass. """
+	return [ ((i * 167) + (seed * 31) + 13) & 0xFF for i in range(0, size) ]
+
+def load_calibration(filename = None):
+	""" Read a file saved by Calibrate.save, returning segment sizes
+	keyed by route, as wanted by Check.segsizes. """
+	segsizes = {}
+	f = open(filename, "r")
+	results = json.load(f)
+	f.close()
+	for name in results:
+		if results[name].get('failed'):
+			continue
+		route = tuple([ int(l) for l in name.split(".")[1:] ])
+		segsizes[route] = results[name]['segsize']
+	return segsizes
+
+###############################################################
+
+class Calibrate():
+	""" Runs error checked echo tests of increasing size to every
+	processor found by a Check instance. """
+
+	def __init__(self, checker = None):
+		self.checker = checker
+		self.logger = checker.logger
+		self.results = {}
+
+	def supported(self):
+		""" True if the resident code on the root echoes frames longer
+		than its own word, which the tests depend on. """
+		root = self.checker.processors[0]
+		if self.checker.ping(processor = root) is False:
+			self.logger.fatal("Root processor doesn't answer echo tests")
+			return False
+		if self.checker.ping(processor = root, pattern = pattern(size = SEGMENT_SIZES[0])) is False:
+			self.logger.fatal("Resident code doesn't echo %s byte test frames, unable to calibrate" % SEGMENT_SIZES[0])
+			return False
+		return True
+
+	def route(self, processor = None):
+		""" Fastest reliable segment size for one route and the rate in
+		bytes per second achieved with it. A failed echo has already
+		been cleared up by Check.ping, so the next route starts clean. """
+		best = 0
+		rate = 0.0
+		for size in SEGMENT_SIZES:
+			elapsed = 0.0
+			for i in range(0, CALIBRATE_PASSES):
+				rtt = self.checker.ping(processor = processor, pattern = pattern(size = size, seed = i))
+				if rtt is False:
+					break
+				elapsed += rtt
+			else:
+				if elapsed > 0:
+					size_rate = (2.0 * size * CALIBRATE_PASSES) / elapsed
+				else:
+					size_rate = 0.0
+				if (best == 0) or (size_rate > rate):
+					best = size
+					rate = size_rate
+				continue
+			self.logger.info("Processor %s failed echo test at %s bytes" % (processor.tpid, size))
+			break
+		return (best, rate)
+
+	def run(self):
+		""" Calibrate every processor. Routes which fail even the
+		smallest test are saved as failed, with no segment size. Returns
+		the results, or False if the resident code can't be calibrated
+		with. """
+		if not self.supported():
+			return False
+		for p in self.checker.processors:
+			if p.tptype == link_hardware.C4:
+				continue
+			best, rate = self.route(processor = p)
+			result = {
+				'tpid' : p.tpid,
+				'segsize' : best,
+				'rate' : rate,
+				'linkspeed' : p.linkspeed,
+			}
+			if best == 0:
+				self.logger.warn("Route to processor %s failed every echo test" % p.tpid)
+				result['segsize'] = None
+				result['failed'] = True
+			else:
+				self.checker.segsizes[p.path()] = best
+			self.results[routename(p.path())] = result
+		return self.results
+
+	def save(self, filename = None):
+		f = open(filename, "w")
+		json.dump(self.results, f, sort_keys = True, indent = 1)
+		f.close()
+
+	def report(self):
+		for name in sorted(self.results.keys()):
+			result = self.results[name]
+			if result.get('failed'):
+				print("Processor %s (%s): FAILED every echo test" % (result['tpid'], name))
+				continue
+			print("Processor %s (%s): segment %s bytes, %.0f bytes/sec" % (result['tpid'], name, result['segsize'], result['rate']))
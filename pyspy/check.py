@@ -19,11 +19,14 @@
 # Basic Python modules
 import sys
 import time
+import struct
 
 # defines, fixed values, lookup tables etc
 from libs.link_settings import SSRESETLO, SSRESETHI, BOOTSTRING, ER_LINK_NOSYNC
 # A python logging tool to debug text
 from libs.link_logger import link_logger
+# buffered, framed reads of iserver replies
+from libs.link_reader import LinkReader
 # more defines about particular hardware types
 import libs.link_hardware as link_hardware
 
@@ -113,6 +116,38 @@ TYPE16 = {
 
 SEGSIZE = 511
 
+# How much is reported for each processor, least first. Each level
+# reports more than the one before:
+#	topology - transputer types and how they are connected
+#	standard - plus bootlink and processor speed
+#	full - plus link speeds
+# This only filters what is reported: every processor is probed the
+# same way whatever the level, since the iserver code only sends its
+# statistics after the link speed test.
+DETAIL_TOPOLOGY = "topology"
+DETAIL_STANDARD = "standard"
+DETAIL_FULL = "full"
+DETAILS = [ DETAIL_TOPOLOGY, DETAIL_STANDARD, DETAIL_FULL ]
+
+# Kinds of result yielded by Check.discover() and Watch.poll()
+EVENT_PROCESSOR = "processor"
+EVENT_LINK = "link"
+EVENT_LOST = "lost"
+EVENT_FOUND = "found"
+EVENT_DRIFT = "drift"
+
+# The 6 byte statistics record sent back by the iserver code:
+# type (signed, as the link_hardware type values are), processor
+# speed, bootlink, link speed count
+STATS = struct.Struct("<hBBH")
+
+# Test patterns echoed back by TAG_TEST16 / TAG_TEST32
+TEST16 = [ 0xA5, 0x5A ]
+TEST32 = [ 0xA5, 0x5A, 0xC3, 0x3C ]
+
+# Echoes tried when getting back in step with a processor
+RESYNC_RETRIES = 3
+
 ###############################################################
 
 class PData():
@@ -136,10 +171,22 @@ class PData():
 			'3' : None,
 		}
 		self.routelen = 0
+		self.route = None
+		self.procspeed = 0
 		self.parent = False
 		self.next = False
 		self.info = []
 		self.tptype = False
+		self.tpclass = False
+		
+	def path(self):
+		""" The link numbers taken from the root to reach this processor. """
+		route = []
+		q = self
+		while q.parent:
+			route.insert(0, q.route)
+			q = q.parent
+		return tuple(route)
 		
 	def __str__(self):
 		return("tpid:%s tptype: %s bootlink:%s linkspeed:%s routelen:%s" % (self.tpid, self.tptype, self.bootlink, self.linkspeed, self.routelen))
@@ -161,97 +208,80 @@ class Check():
 			self.logger.debug(self.link.config)			
 		self.readbytes_buf = []
 		self.readbytes_length = 0
+		self.reader = LinkReader(self.link)
+		self.processors = []
+		self.outputs = []
+		self.until = None
+		self.segsizes = {}
+		self.detail = self.link.config["detail"]
 		
 
 	################################################################
 	
-	def readbytes(self, maxlength = 0):
-		""" """
-		
-		bytes_to_go = maxlength
-		bytes_read = []
-		count = 10
-		bytes_read_count = 0
-			
-		self.logger.debug("readbytes maxlength: %s" % maxlength)
-			
-		while ((bytes_to_go > 0) and (count > 0)):
-		 	bytes_read_count = self.link.ReadLink(count = bytes_to_go)
-		 	bytes_read = bytes_read + self.link.buf
-			self.logger.debug("loop - readbytes(bytesread = %s)" % bytes_read_count)
-			bytes_to_go -= bytes_read_count
-			count -= 1
-	
-		if (bytes_read_count < 0):
-			self.logger.warn("Read from link failed - result = %s" % bytes_read_count)
-			bytes_read_count = 0;
-		else:
-			if (count == 0):
-				self.logger.warn("Read from link failed (Timeout)")
-			else:
-				bytes_read_count = maxlength - bytes_to_go
-	
-		self.logger.debug("readbytes(bytesread = %s)" % bytes_read_count)
-	
-		self.readbytes_buf = bytes_read
-		return bytes_read_count
-		
-	################################################################
-
 	def getiserver(self, maxlength = 0):
-		""" """
+		""" Read one length-prefixed reply from the iserver code running
+		on a transputer. The payload is left in readbytes_buf as a view
+		into the read-ahead buffer, its length in readbytes_length. """
 		self.readbytes_buf = []
 		self.readbytes_length = 0
 		self.logger.debug("Querying iserver")
-		if (self.readbytes(maxlength = 2) == 2):
-			self.readbytes_length = (self.readbytes_buf[1] << 8) + self.readbytes_buf[0]
-			if ((self.readbytes_length <= maxlength) and (self.readbytes_length) and (self.readbytes(maxlength = self.readbytes_length) == self.readbytes_length)):
-				return True
-			else:
-				if (self.readbytes_length):
-					return False
-				else:
-					# length of zero
-					return True
-		else:
+		frame = self.reader.read_frame(maxlength = maxlength)
+		if frame is None:
 			return False
+		self.readbytes_buf = frame
+		self.readbytes_length = len(frame)
+		return True
 
 	################################################################
 	
 	def getstats(self, processor = None):
-		""" """
+		""" Read the statistics record the iserver code sends back once
+		it has been loaded and speed tested. """
 		
 		self.logger.debug("Getstats running for processor %s" % processor.tpid)
-		if ((self.getiserver(maxlength = 6)) and (self.readbytes_length == 6)):
-			tptype = self.readbytes_buf[0] + (self.readbytes_buf[1] << 8)
-			if (processor.tptype == link_hardware.T32):
-				processor.tptype = tptype;
-			elif ((processor.tptype == link_hardware.T16) and (tptype == link_hardware.T_414)):
-				processor.tptype = link_hardware.T_212;
-			
-			processor.bootlink = self.readbytes_buf[3]
-			processor.links[processor.bootlink] = processor.parent
-			
-			if (processor.parent):
-				processor.linkno[processor.bootlink] = processor.route
-				processor.parent.linkno[processor.route] = processor.bootlink
-			else:
-				processor.linkno[processor.bootlink] = link_hardware.HOST_TAG
-			
-			processor.procspeed = self.readbytes_buf[2]
-			processor.linkspeed = float(self.readbytes_buf[4] + (self.readbytes_buf[5] << 8))
-			if (processor.linkspeed != 0.0):
-				processor.linkspeed = float(256.0E6 / processor.linkspeed)
-			return processor
+		if ((self.getiserver(maxlength = STATS.size)) and (self.readbytes_length == STATS.size)):
+			return self.applystats(processor, *STATS.unpack_from(self.readbytes_buf))
+		else:
+			self.logger.fatal("Partial results : Error reading Transputer %s type information" % processor.tpid)
+			return False
+
+	################################################################
+	
+	def applystats(self, processor = None, tptype = 0, procspeed = 0, bootlink = 255, linkspeed = 0):
+		""" Fill in a processor from one decoded statistics record,
+		keeping only what the report detail level asked for. """
+		
+		if (processor.tptype == link_hardware.T32):
+			processor.tptype = tptype;
+		elif ((processor.tptype == link_hardware.T16) and (tptype == link_hardware.T_414)):
+			processor.tptype = link_hardware.T_212;
+		
+		processor.bootlink = bootlink
+		processor.links[str(processor.bootlink)] = processor.parent
+		
+		if (processor.parent):
+			processor.linkno[str(processor.bootlink)] = processor.route
+			processor.parent.links[str(processor.route)] = processor
+			processor.parent.linkno[str(processor.route)] = processor.bootlink
 		else:
-			self.logger.fatal("%s Partial results : Error reading Transputer %s type information" % ( i, processor.tpid))
+			processor.linkno[str(processor.bootlink)] = link_hardware.HOST_TAG
+		
+		processor.procspeed = procspeed
+		processor.linkspeed = float(linkspeed)
+		if (processor.linkspeed != 0.0):
+			processor.linkspeed = float(256.0E6 / processor.linkspeed)
+		if (self.detail != DETAIL_FULL):
+			processor.linkspeed = 0.0
+			if self.detail == DETAIL_TOPOLOGY:
+				processor.procspeed = 0
+		return processor
 
 	################################################################
 	
 	def linkspeed(self, processor = None):
 		""" Determine how fast a specific transputer link is. """
 		
-		linkspeed = [ 0xFF, 0xFF, TAG_LSPEED ]
+		linkspeed = [ 0xFF, 0xFF, link_hardware.TAG_LSPEED ]
 		self.logger.debug("Testing link speed to processor %s" % processor.tpid)
 		self.setroute(processor = processor.parent, lastlink = processor.route)
 		if (self.link.WriteLink(bytes = linkspeed, count = 3) == 3):
@@ -264,7 +294,11 @@ class Check():
 	################################################################
 
 	def setroute(self, processor = None, lastlink = None):
-		""" Record which are the available links on a given processor. """
+		""" Tell the iserver code the path to act on for the next command:
+		the link taken out of each processor from the root down to
+		'processor', then 'lastlink' out of that one. The whole path is
+		always sent, even when 'processor' is the root, since lastlink is
+		then the only thing saying which of its links to use. """
 		
 		self.logger.debug("Running setroute  for processor %s" % processor.tpid)
 		new_processor = PData()
@@ -277,12 +311,18 @@ class Check():
 		#	route[i - 1] = (unsigned char) q->route;
 		#}
 		i = processor.routelen
-		while (i > 0):
-			new_processor = processor
+		new_processor = processor
+		while ((i > 0) and new_processor):
 			route[i - 1] = new_processor.route
+			new_processor = new_processor.parent
 			i = i - 1
 			self.logger.debug("i: %s route: %s new_processor: %s" % (i, route, new_processor))
 		
+		setpath = [ 0xFF, 0xFF, link_hardware.TAG_SETPATH ]
+		if (self.link.WriteLink(bytes = setpath, count = len(setpath)) != len(setpath)) or not self.sendiserver(codesize = len(route), bytes = route):
+			self.logger.fatal("Unable to send route to processor %s" % processor.tpid)
+			self.link.CloseLink()
+			sys.exit(2)
 		return processor
 	
 	################################################################
@@ -292,14 +332,14 @@ class Check():
 		
 		if processor.parent:
 			self.logger.debug("Sending pre-boot to processor %s" % processor.tpid)
-			processor = self.setroute(processor = processor.parent, lastlink = processor.route)
-			bytes = link.WriteLink(bytes = TPBOOT, count = len(TPBOOT))
+			self.setroute(processor = processor.parent, lastlink = processor.route)
+			bytes = self.link.WriteLink(bytes = TPBOOT, count = len(TPBOOT))
 			if bytes == 3:
 				self.logger.info("Sent pre-boot code over link to processor %s" % processor.tpid)
 				return processor
 			else:
 				self.logger.fatal("Error sending pre-boot code to processor %s" % processor.tpid)
-				link.CloseLink()
+				self.link.CloseLink()
 				sys.exit(2)
 		else:
 			return processor
@@ -311,9 +351,7 @@ class Check():
 		transputer processor which we can then use to run commands for
 		use - for example detecting amount of ram, link speed etc. """
 		
-		buf = []
-		buf[0] = codesize & 0xFF
-		buf[1] = codesize >> 8
+		buf = [ codesize & 0xFF, codesize >> 8 ]
 		
 		self.logger.debug("Sending iserver code to processor")
 		if (self.link.WriteLink(buf, 2) == 2):
@@ -329,6 +367,14 @@ class Check():
 	
 	################################################################
 	
+	def segsize(self, processor = None):
+		""" Largest segment to send down the route to a processor in one
+		go - SEGSIZE, unless calibration found it unreliable. """
+		
+		return self.segsizes.get(processor.path(), SEGSIZE)
+	
+	################################################################
+	
 	def load(self, processor = None, codesize = 0, offset = 0, workspace = 0, vectorspace = 0, bytesperword = 0, code = []):
 		""" Uploads basic runtime data onto a transputer which can 
 		detect the type and model of processor, the amount of ram and
@@ -373,7 +419,7 @@ class Check():
 			# Load second phase of iserver code
 			if processor.parent:
 				self.logger.info("iserver 2 on %s" % processor.tpid)
-				flag = self.sendiserver(count = (4 * bytesperword), bytes = params);
+				flag = self.sendiserver(codesize = (4 * bytesperword), bytes = params);
 			else:
 				self.logger.info("writelink 2 on %s" % processor.tpid)
 				if (self.link.WriteLink(bytes = params, count = (4 * bytesperword)) == (4 * bytesperword)):
@@ -386,14 +432,14 @@ class Check():
 			count = 0
 			while (i < length):	
 				count = length - i;
-				if (count > SEGSIZE):
-					count = SEGSIZE				
+				if (count > self.segsize(processor)):
+					count = self.segsize(processor)
 				if processor.parent:
 					self.logger.info("iserver 3 on %s" % processor.tpid)
-					flag = self.sendiserver(count = count, bytes = code[i:count]);
+					flag = self.sendiserver(codesize = count, bytes = code[i:i + count]);
 				else:
 					self.logger.info("writelink 3 on %s" % processor.tpid)
-					if (self.link.WriteLink(bytes = code[i:count], count = count) == count):
+					if (self.link.WriteLink(bytes = code[i:i + count], count = count) == count):
 						flag = True
 					else:
 						flag = False
@@ -427,25 +473,25 @@ class Check():
 			
 			self.link.Wait()
 			going = True
-			bytes = []
 			cnt = 0	
+			self.reader.reset()
 			# Read back the data as returned by the code now
 			# running on the root transputer cpu. This should
 			# start with several bytes describing the transputer type.
+			# Ask for everything outstanding in each read rather than
+			# a byte at a time.
 			while (going):
-				read_result = self.link.ReadLink(1)
+				read_result = self.reader.fill(want = 4 - self.reader.available())
 				cnt += 1
 				if (cnt >= 30):
 					going = False
 				
-				if (read_result == 1):
-					bytes = bytes + self.link.buf
-				
-				if (read_result == ER_LINK_NOSYNC):
+				if (read_result is False) or (read_result == ER_LINK_NOSYNC):
 					going = False
 				
-				if (len(bytes) == 4):
+				if (self.reader.available() >= 4):
 					going = False
+			bytes = bytearray(self.reader.read(count = 4, retries = 0))
 		
 			if len(bytes) == 1:
 				# Found a C4
@@ -480,13 +526,12 @@ class Check():
 	
 	################################################################
 	
-	def check(self):
-		""" Check the basic transputer network is present, resetting
-		root processor and subsystems if needed, and then boot each
-		transputer in turn, detecting the type and capabilities of 
-		each one. """
+	def reset(self, force = False):
+		""" Reset the root processor and subsystems, as selected in the
+		link configuration, or both whatever it says if 'force' is set. """
 		
-		if self.link.config["root_reset"]:
+		self.reader.reset()
+		if force or self.link.config["root_reset"]:
 			# Try and do a root transputer subsystem reset
 			status = self.link.ResetLink()
 			if (status == False):
@@ -496,7 +541,7 @@ class Check():
 			else:
 				self.logger.info("Reset root transputer")
 			
-		if self.link.config["root_subsys_reset"]:
+		if force or self.link.config["root_subsys_reset"]:
 			# Try and reset subsystems
 			bytes = self.link.WriteLink(SSRESETLO, len(SSRESETLO))
 			if (bytes != len(SSRESETLO)):
@@ -523,73 +568,281 @@ class Check():
 				sys.exit(2)
 			else:
 				self.logger.info("Reset subsystem 3")
-			self.link.Wait()	
+			self.link.Wait()
+	
+	################################################################
+	
+	def examine(self, processor = None):
+		""" Load the iserver code on to a transputer whose class is already
+		known, test the link speed to it and read back its statistics.
+		Returns the updated processor, or False if it did not answer. """
+		
+		p = processor
+		self.logger.info("Attempting to load code on to Transputer %s" % p.tpid)
+		# Try and load 16bit boot code on the transputer
+		if (p.tptype == link_hardware.T16):
+			success = self.load(processor = p, 
+					codesize = TYPE16['codesize'],
+					offset = TYPE16['offset'],
+					workspace = TYPE16['workspace'],
+					vectorspace = TYPE16['vectorspace'],
+					bytesperword = TYPE16['bytesperword'],
+					code = TYPE16['code'])
+			if success is False:
+				self.logger.fatal("Failed to load TYPE16 code on Transputer %s" % p.tpid)
+				self.link.CloseLink()
+				sys.exit(2)
+			else:
+				p = success
+				self.logger.info("Loaded TYPE16 class transputer")
+			
+		# Try to load 32bit boot code on the transputer
+		if (p.tptype == link_hardware.T32):
+			success = self.load(processor = p, 
+					codesize = TYPE32['codesize'],
+					offset = TYPE32['offset'],
+					workspace = TYPE32['workspace'],
+					vectorspace = TYPE32['vectorspace'],
+					bytesperword = TYPE32['bytesperword'],
+					code = TYPE32['code'])
+			if success is False:
+				self.logger.fatal("Failed to load TYPE32 code on Transputer %s" % p.tpid)
+				self.link.CloseLink()
+				sys.exit(2)
+			else:
+				p = success
+				self.logger.info("Loaded TYPE32 class transputer")
+		
+		# Test the link interface speed to this transputer. This is
+		# done whatever the detail level, as the iserver code only sends
+		# its statistics once it has timed the burst
+		self.logger.info("Testing speed to Transputer %s" % p.tpid)
+		if p.routelen == 0:
+			self.logger.debug("Using root processor test")
+			tmpbuffer = [0x00] * 257
+			written = self.link.WriteLink(bytes = tmpbuffer, count = 257)
+			if written != 257:
+				self.logger.fatal("Failed sending all data during link speed test")
+				self.link.CloseLink()
+				sys.exit(2)
+		else:
+			self.logger.debug("Using linkspeed processor test")
+			self.linkspeed(p)
+		self.logger.debug("Speed test completed")
 			
+		# Get stats - always sent after the speed test
+		p = self.getstats(processor = p)
+		self.logger.debug(p)
+		return p
+	
+	################################################################
+	
+	def probetype(self, processor = None):
+		""" As findtype, but for a transputer hanging off a link of an
+		already booted processor. The boot string is passed down the route
+		by the iserver code on the parent and the reply comes back as an
+		iserver frame. Returns False if nothing answered on that link. """
+		
+		self.logger.debug("Probing link %s of processor %s" % (processor.route, processor.parent.tpid))
+		self.tpboot(processor = processor)
+		if not self.sendiserver(codesize = len(BOOTSTRING), bytes = BOOTSTRING):
+			return False
+		self.link.Wait()
+		if not self.getiserver(maxlength = 4):
+			return False
+		
+		bytes = bytearray(self.readbytes_buf)
+		if len(bytes) == 1:
+			return link_hardware.C4
+		if (len(bytes) == 2) and (bytes[0] == 0xAA) and (bytes[1] == 0xAA):
+			return link_hardware.T16
+		if (len(bytes) == 4) and (bytes[0] == 0xAA) and (bytes[1] == 0xAA):
+			return link_hardware.T32
+		return False
+	
+	################################################################
+	
+	def neighbours(self, processor = None):
+		""" Probe every link of a booted processor other than its bootlink
+		and any already known to be connected. Returns a list of new
+		PData, one for each transputer that answered. """
+		
+		p = processor
+		found = []
+		for linkno in range(0, 4):
+			if (linkno == p.bootlink) or p.links[str(linkno)]:
+				continue
+			child = PData()
+			child.parent = p
+			child.route = linkno
+			child.routelen = p.routelen + 1
+			child.tptype = self.probetype(processor = child)
+			child.tpclass = child.tptype
+			if child.tptype is False:
+				self.logger.debug("Nothing on link %s of processor %s" % (linkno, p.tpid))
+				continue
+			p.links[str(linkno)] = child
+			found.append(child)
+		return found
+	
+	################################################################
+	
+	def ping(self, processor = None, pattern = None, resync = True):
+		""" Cheapest check that a booted processor is still alive: send a
+		TAG_TEST16 / TAG_TEST32 echo request along its cached route and
+		wait for the pattern to come back. Returns the round trip time in
+		seconds, or False if it did not answer correctly. The built-in
+		iserver code echoes one 16 or 32 bit word (TEST16 / TEST32); a
+		longer pattern may be given to test the route more thoroughly
+		if the resident code echoes whole frames. After a failure the
+		link is put back in step with resync(), so that the next request
+		doesn't read the remains of this one. """
+		
+		if processor.tpclass == link_hardware.T16:
+			test = [ 0xFF, 0xFF, link_hardware.TAG_TEST16 ]
+			if pattern is None:
+				pattern = TEST16
+		else:
+			test = [ 0xFF, 0xFF, link_hardware.TAG_TEST32 ]
+			if pattern is None:
+				pattern = TEST32
+		
+		self.logger.debug("Pinging processor %s" % processor.tpid)
+		start = time.time()
+		if processor.parent:
+			self.setroute(processor = processor.parent, lastlink = processor.route)
+		if ((self.link.WriteLink(bytes = test, count = len(test)) == len(test))
+				and self.sendiserver(codesize = len(pattern), bytes = pattern)
+				and self.getiserver(maxlength = len(pattern))):
+			if bytearray(self.readbytes_buf) == bytearray(pattern):
+				return time.time() - start
+			self.logger.warn("Processor %s echoed a bad test pattern" % processor.tpid)
+		if resync:
+			self.resync(processor = processor)
+		return False
+	
+	def resync(self, processor = None):
+		""" Get back in step with the iserver code after a failed or
+		corrupt reply: throw away whatever is buffered or still arriving
+		on the link, then check that a default echo gets through to the
+		processor again. Returns True if it did. """
+		
+		self.logger.debug("Resynchronising with processor %s" % processor.tpid)
+		self.reader.reset()
+		self.link.Wait()
+		while self.reader.fill(want = len(self.reader.buf)) > 0:
+			self.reader.reset()
+		self.reader.reset()
+		for i in range(0, RESYNC_RETRIES):
+			if self.ping(processor = processor, resync = False) is not False:
+				return True
+		self.logger.warn("Unable to resynchronise with processor %s" % processor.tpid)
+		return False
+	
+	################################################################
+	
+	def children(self, processor = None):
+		""" Processors booted from this one, in link order, as
+		(linkno, processor) pairs. Link switches are left out. """
+		
+		found = []
+		for linkno in range(0, 4):
+			q = processor.links[str(linkno)]
+			if isinstance(q, PData) and (q.parent is processor) and (q.tptype != link_hardware.C4) and (q in self.processors):
+				found.append((linkno, q))
+		return found
+	
+	################################################################
+	
+	def treeorder(self):
+		""" Every processor except link switches, depth first in link
+		order from the root, each one ahead of everything beneath it -
+		the order in which resident code passes per-processor records
+		back up the tree. """
+		
+		found = []
+		stack = [ self.processors[0] ]
+		while stack:
+			p = stack.pop()
+			found.append(p)
+			for (linkno, q) in reversed(self.children(processor = p)):
+				stack.append(q)
+		return found
+	
+	################################################################
+	
+	def discover(self):
+		""" Generator which walks the network from the root transputer
+		outwards, booting each processor in turn. Results are yielded as
+		soon as they are confirmed, so that callers can process a large
+		network as it is found rather than waiting for the whole map:
+		
+			(EVENT_PROCESSOR, p)
+			(EVENT_LINK, p, linkno, q, qlinkno)
+		
+		where q is None (and qlinkno HOST_TAG) for the host link of the
+		root processor, and linkno None too if the root is a C004. Every
+		processor found is also kept in self.processors. """
+		
+		self.processors = []
+		
 		# Find details of the root transputer
-		p = PData()
-		p.tptype = self.findtype()
+		root = PData()
+		root.tptype = self.findtype()
+		root.tpclass = root.tptype
 		self.logger.info("Detected root transputer class")
-	
-		going = True
 		
 		# Keep running this loop until we've found all
 		# the transputers which are connected to the root
 		# processor by all of its links, and then all of
 		# their links.
-		while (going):
+		pending = [ root ]
+		while pending:
+			p = pending.pop(0)
+			p.tpid = len(self.processors)
+			self.processors.append(p)
 			
-			self.logger.info("Attempting to load code on to Transputer %s" % p.tpid)
-			# Try and load 16bit boot code on the transputer
-			if (p.tptype == link_hardware.T16):
-				success = self.load(processor = p, 
-						codesize = TYPE16['codesize'],
-						offset = TYPE16['offset'],
-						workspace = TYPE16['workspace'],
-						vectorspace = TYPE16['vectorspace'],
-						bytesperword = TYPE16['bytesperword'],
-						code = TYPE16['code'])
-				if success is False:
-					self.logger.fatal("Failed to load TYPE16 code on Transputer %s" % p.tpid)
-					self.link.CloseLink()
-					sys.exit(2)
-				else:
-					p = success
-					self.logger.info("Loaded TYPE16 class transputer")
-				
-			# Try to load 32bit boot code on the transputer
-			if (p.tptype == link_hardware.T32):
-				success = self.load(processor = p, 
-						codesize = TYPE32['codesize'],
-						offset = TYPE32['offset'],
-						workspace = TYPE32['workspace'],
-						vectorspace = TYPE32['vectorspace'],
-						bytesperword = TYPE32['bytesperword'],
-						code = TYPE32['code'])
-				if success is False:
-					self.logger.fatal("Failed to load TYPE32 code on Transputer %s" % p.tpid)
-					self.link.CloseLink()
-					sys.exit(2)
+			if p.tptype == link_hardware.C4:
+				# Link switches have no iserver to talk to
+				yield (EVENT_PROCESSOR, p)
+				if p.parent:
+					yield (EVENT_LINK, p.parent, p.route, p, None)
 				else:
-					p = success
-					self.logger.info("Loaded TYPE32 class transputer")
+					# Which of its links the host is on can't be asked
+					yield (EVENT_LINK, p, None, None, link_hardware.HOST_TAG)
+				continue
 			
-			# Test the link interface speed to this transputer
-			self.logger.info("Testing speed to Transputer %s" % p.tpid)
-			print p
-			if p.routelen == 0:
-				self.logger.debug("Using root processor test")
-				tmpbuffer = [0x00] * 257
-				written = self.link.WriteLink(bytes = tmpbuffer, count = 257)
-				if written != 257:
-					self.logger.fatal("Failed sending all data during link speed test")
-					self.link.CloseLink()
-					sys.exit(2)
+			if self.examine(processor = p) is False:
+				self.processors.remove(p)
+				continue
+			yield (EVENT_PROCESSOR, p)
+			if p.parent:
+				yield (EVENT_LINK, p.parent, p.route, p, p.bootlink)
 			else:
-				self.logger.debug("Using linkspeed processor test")
-				self.linkspeed(p)
-			self.logger.debug("Speed test completed")
-				
-			# Get stats
-			p = self.getstats(processor = p)
-			print p
-			time.sleep(10)
\ No newline at end of file
+				yield (EVENT_LINK, p, p.bootlink, None, link_hardware.HOST_TAG)
+			
+			# Look for neighbours on every other link
+			pending.extend(self.neighbours(processor = p))
+	
+	################################################################
+	
+	def check(self):
+		""" Check the basic transputer network is present, resetting
+		root processor and subsystems if needed, and then boot each
+		transputer in turn, detecting the type and capabilities of 
+		each one. Each result is passed to the writers in self.outputs
+		as it is found, and scanning stops early if self.until is set
+		and returns True for one of them. Returns the list of
+		processors. """
+		
+		self.reset()
+		for event in self.discover():
+			self.logger.info(" ".join(str(e) for e in event))
+			for output in self.outputs:
+				output.event(event)
+			if self.until and self.until(event):
+				self.logger.info("Stopping scan early")
+				break
+		for output in self.outputs:
+			output.close(self.processors)
+		return self.processors
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+################################################################
+#
+# compare.py: Checks the network found by check.py against a
+# reference map, as ispy's compare option did.
+#
+# The reference is a file previously written with --json. Every
+# processor, live or expected, is given a canonical label made
+# from its type, its bootlink and the labels of whatever hangs
+# off each of its links in link order. Labels are worked out
+# children first in a single pass, so a network of any size is
+# compared in linear time, and whole matching subtrees are
+# skipped without looking inside them.
+#
+# by John Snowdon (John.Snowdon@newcastle.ac.uk) 2016.
+#
+###############################################################
+
+# Basic Python modules
+import json
+import hashlib
+
+# more defines about particular hardware types
+from pyspy.check import EVENT_PROCESSOR, EVENT_LINK
+from pyspy.output import tpname
+
+###############################################################
+
+class Node():
+	""" One processor of a map, live or expected, reduced to what is
+	compared. children maps link number to Node. """
+
+	def __init__(self, tptype = None, bootlink = None):
+		self.tptype = tptype
+		self.bootlink = bootlink
+		self.children = {}
+		self.route = ()
+		self.label = None
+
+def label(root = None):
+	""" Give every node under root its canonical label. Nodes are
+	labelled deepest first, so no recursion is needed however long
+	the chains in the network are. Returns the nodes in breadth
+	first order. """
+
+	order = [ root ]
+	for node in order:
+		for linkno in sorted(node.children.keys()):
+			child = node.children[linkno]
+			child.route = node.route + (linkno,)
+			order.append(child)
+
+	for node in reversed(order):
+		text = "%s/%s" % (node.tptype, node.bootlink)
+		for linkno in sorted(node.children.keys()):
+			text += "|%s:%s" % (linkno, node.children[linkno].label)
+		node.label = hashlib.sha1(text.encode("ascii")).hexdigest()
+	return order
+
+def routename(route = None):
+	""" Printable route from the root, e.g. root.2.1 """
+	return ".".join([ "root" ] + [ str(l) for l in route ])
+
+###############################################################
+
+class Compare():
+	""" A reference map loaded from a JSON lines file, which can be
+	compared with a live list of processors from Check. """
+
+	def __init__(self, filename = None):
+		self.filename = filename
+		self.root = None
+		self.nodes = {}
+		self.load()
+		self.order = label(self.root)
+		self.routes = {}
+		for node in self.order:
+			self.routes[node.route] = node
+		self.confirmed = 0
+		self.failed = False
+		self.stopping = False
+
+	def load(self):
+		""" Read the processor and link records of a --json map. """
+		processors = {}
+		links = []
+		f = open(self.filename, "r")
+		for line in f:
+			line = line.strip()
+			if not line:
+				continue
+			record = json.loads(line)
+			if record['type'] == EVENT_PROCESSOR:
+				processors[record['tpid']] = record
+				self.nodes[record['tpid']] = Node(tptype = record['tptype'], bootlink = record['bootlink'])
+			elif record['type'] == EVENT_LINK:
+				links.append(record)
+		f.close()
+
+		for record in links:
+			if record['to'] == 'host':
+				self.root = self.nodes[record['from']]
+			elif processors[record['to']]['parent'] == record['from']:
+				self.nodes[record['from']].children[record['fromlink']] = self.nodes[record['to']]
+		if self.root is None:
+			# A map saved without its host link - the root has no parent
+			for tpid in processors:
+				if processors[tpid]['parent'] is None:
+					self.root = self.nodes[tpid]
+		if self.root is None:
+			raise ValueError("no processors found in %s" % self.filename)
+
+	def live(self, processors = None):
+		""" Turn the processors found by Check into Nodes. """
+		nodes = {}
+		root = None
+		for p in processors:
+			nodes[p.tpid] = Node(tptype = tpname(p.tptype), bootlink = p.bootlink)
+		for p in processors:
+			if p.parent and (p.parent.tpid in nodes):
+				nodes[p.parent.tpid].children[p.route] = nodes[p.tpid]
+			elif not p.parent:
+				root = nodes[p.tpid]
+		return root
+
+	################################################################
+
+	def until(self, event = None):
+		""" For Check.until - True once scanning can stop: either a
+		processor has been found which is not in the reference, or
+		every processor in the reference has been seen. The decision is
+		made on the processor event but only returned with the link
+		event which follows it, so a map written alongside still has a
+		link for every processor in it. """
+
+		if event[0] == EVENT_LINK:
+			return self.stopping
+		if event[0] != EVENT_PROCESSOR:
+			return False
+		p = event[1]
+		route = p.path()
+		expected = self.routes.get(route)
+		if expected is None:
+			self.failed = "%s: unexpected %s" % (routename(route), tpname(p.tptype))
+			self.stopping = True
+		elif expected.tptype != tpname(p.tptype):
+			self.failed = "%s: expected %s, found %s" % (routename(route), expected.tptype, tpname(p.tptype))
+			self.stopping = True
+		else:
+			self.confirmed += 1
+			self.stopping = self.confirmed >= len(self.routes)
+		return False
+
+	def differences(self, processors = None):
+		""" List of differences between the reference and the live
+		network, each a printable string. Only subtrees whose labels
+		differ are examined. """
+
+		found = []
+		live = self.live(processors)
+		if live is None:
+			return [ "No processors found, expected %s" % len(self.routes) ]
+		label(live)
+
+		pairs = [ (self.root, live) ]
+		for (expected, actual) in pairs:
+			if expected.label == actual.label:
+				continue
+			where = routename(expected.route)
+			if expected.tptype != actual.tptype:
+				found.append("%s: expected %s, found %s" % (where, expected.tptype, actual.tptype))
+			if expected.bootlink != actual.bootlink:
+				found.append("%s: expected bootlink %s, found %s" % (where, expected.bootlink, actual.bootlink))
+			for linkno in sorted(set(expected.children.keys()) | set(actual.children.keys())):
+				if linkno not in actual.children:
+					found.append("%s: missing %s on link %s" % (where, expected.children[linkno].tptype, linkno))
+				elif linkno not in expected.children:
+					found.append("%s: unexpected %s on link %s" % (where, actual.children[linkno].tptype, linkno))
+				else:
+					pairs.append((expected.children[linkno], actual.children[linkno]))
+		return found
+
+	def report(self, processors = None):
+		""" Print the differences from the reference. Returns True if
+		the network matched. """
+
+		if self.failed:
+			# Scan was stopped early, so the rest of the map is unknown
+			found = [ self.failed ]
+		else:
+			found = self.differences(processors)
+		for line in found:
+			print(line)
+		if not found:
+			print("Network matches %s (%s processors)" % (self.filename, len(self.routes)))
+		return len(found) == 0
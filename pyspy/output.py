@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+################################################################
+#
+# output.py: Structured output of the network map found by
+# check.py, either streamed one record at a time as each
+# processor and link is confirmed (JSON Lines), or written out
+# once the map is complete (Graphviz DOT).
+#
+# by John Snowdon (John.Snowdon@newcastle.ac.uk) 2016.
+#
+###############################################################
+
+# Basic Python modules
+import json
+
+# more defines about particular hardware types
+import libs.link_hardware as link_hardware
+from pyspy.check import EVENT_PROCESSOR, EVENT_LINK, EVENT_LOST, EVENT_FOUND, EVENT_DRIFT
+
+###############################################################
+
+def tpname(tptype = None):
+	""" Printable name of a transputer type. """
+	return link_hardware.NAMES.get(tptype, str(tptype))
+
+def processor_record(p = None):
+	""" A dictionary describing a single processor. """
+	record = {
+		'type' : EVENT_PROCESSOR,
+		'tpid' : p.tpid,
+		'tptype' : tpname(p.tptype),
+		'bootlink' : p.bootlink,
+		'procspeed' : p.procspeed,
+		'linkspeed' : p.linkspeed,
+		'routelen' : p.routelen,
+		'parent' : None,
+	}
+	if p.parent:
+		record['parent'] = p.parent.tpid
+	return record
+
+def link_record(p = None, linkno = None, q = None, qlinkno = None):
+	""" A dictionary describing the link between two processors, or
+	between a processor and the host if q is None. """
+	record = {
+		'type' : EVENT_LINK,
+		'from' : p.tpid,
+		'fromlink' : linkno,
+		'to' : 'host',
+		'tolink' : None,
+	}
+	if q:
+		record['to'] = q.tpid
+		record['tolink'] = qlinkno
+	return record
+
+###############################################################
+
+class JsonLinesOutput():
+	""" Writes one JSON object per line for every processor and link as
+	soon as it is found, flushing as it goes so that a reader on the
+	other end of a pipe sees each record straight away. """
+
+	def __init__(self, stream = None):
+		self.stream = stream
+
+	def write(self, record = None):
+		self.stream.write(json.dumps(record, sort_keys = True) + "\n")
+		self.stream.flush()
+
+	def event(self, event = None):
+		if event[0] == EVENT_PROCESSOR:
+			self.write(processor_record(event[1]))
+		elif event[0] == EVENT_LINK:
+			self.write(link_record(*event[1:]))
+		elif event[0] in [ EVENT_LOST, EVENT_FOUND ]:
+			self.write({ 'type' : event[0], 'tpid' : event[1].tpid })
+		elif event[0] == EVENT_DRIFT:
+			self.write({ 'type' : event[0], 'tpid' : event[1].tpid, 'old' : event[2], 'new' : event[3] })
+
+	def close(self, processors = None):
+		pass
+
+###############################################################
+
+class DotOutput():
+	""" Writes the complete network map as a Graphviz DOT graph once
+	discovery has finished. """
+
+	def __init__(self, stream = None):
+		self.stream = stream
+		self.links = []
+
+	def event(self, event = None):
+		if event[0] == EVENT_LINK:
+			self.links.append(event[1:])
+
+	def close(self, processors = None):
+		self.stream.write("graph transputers {\n")
+		self.stream.write("\thost [shape=box, label=\"Host\"];\n")
+		for p in processors:
+			self.stream.write("\tT%s [label=\"%s\\n%s\"];\n" % (p.tpid, p.tpid, tpname(p.tptype)))
+		for (p, linkno, q, qlinkno) in self.links:
+			if q:
+				self.stream.write("\tT%s -- T%s [taillabel=\"%s\", headlabel=\"%s\"];\n" % (p.tpid, q.tpid, linkno, qlinkno))
+			elif linkno is None:
+				self.stream.write("\tT%s -- host;\n" % p.tpid)
+			else:
+				self.stream.write("\tT%s -- host [taillabel=\"%s\"];\n" % (p.tpid, linkno))
+		self.stream.write("}\n")
+		self.stream.flush()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+################################################################
+#
+# selftest.py: Runs a test kernel on every processor of a mapped
+# network at the same time, rather than testing each one from the
+# host in turn.
+#
+# The test kernel is broadcast booted with boot.py, so it reaches
+# the whole network in one pass. Each copy tests its own CPU, FPU
+# (where there is one) and memory, then sends back one fixed size
+# record of its own, followed by the records of everything beneath
+# each of its links in turn, in link order. The host therefore
+# receives a single frame of records in the same depth first order
+# as the boot tree, each processor ahead of its subtree
+# (Check.treeorder):
+#
+#	2 byte little-endian length, then for each processor:
+#	1 byte flags, 1 byte spare, 2 byte memory size in Kbytes,
+#	4 byte time taken in microseconds.
+#
+# by John Snowdon (John.Snowdon@newcastle.ac.uk) 2016.
+#
+###############################################################
+
+# Basic Python modules
+import struct
+
+# buffered, framed reads of iserver replies
+from libs.link_reader import LinkReader, FRAME_HEADER
+from pyspy.boot import NetworkLoader
+from pyspy.output import tpname
+
+###############################################################
+
+# One result record
+RECORD = struct.Struct("<BBHI")
+
+# Bits in the record flags
+TEST_CPU = 0x01
+TEST_FPU = 0x02
+TEST_HASFPU = 0x04
+TEST_MEMORY = 0x08
+
+# Reads to wait through for the results while the tests run
+TEST_RETRIES = 60
+
+###############################################################
+
+class SelfTest():
+	""" Broadcast boot a test kernel and collect the results from every
+	processor in one transfer. """
+
+	def __init__(self, checker = None, loader = None):
+		self.checker = checker
+		self.link = checker.link
+		self.logger = checker.logger
+		self.network = NetworkLoader(checker, loader = loader)
+		self.results = []
+
+	def run(self, kernel = None):
+		""" Load the test kernel everywhere and read back the results.
+		Returns True if every processor passed. """
+
+		if not self.network.load(kernel):
+			return False
+
+		# Records arrive each processor first, then its subtree
+		processors = self.checker.treeorder()
+		length = RECORD.size * len(processors)
+		reader = LinkReader(self.link, size = FRAME_HEADER + length)
+		frame = reader.read_frame(maxlength = length, retries = TEST_RETRIES)
+		if (frame is None) or (len(frame) != length):
+			self.logger.fatal("Expected self test results for %s processors" % len(processors))
+			return False
+
+		self.results = []
+		passed = True
+		for i in range(0, len(processors)):
+			flags, spare, memory, elapsed = RECORD.unpack_from(frame, i * RECORD.size)
+			p = processors[i]
+			ok = bool(flags & TEST_CPU) and bool(flags & TEST_MEMORY)
+			if flags & TEST_HASFPU:
+				ok = ok and bool(flags & TEST_FPU)
+			passed = passed and ok
+			self.results.append((p, flags, memory, elapsed))
+		return passed
+
+	def report(self):
+		""" Print one line of results per processor. """
+
+		def state(flags, bit):
+			if flags & bit:
+				return "pass"
+			return "FAIL"
+
+		for (p, flags, memory, elapsed) in self.results:
+			if flags & TEST_HASFPU:
+				fpu = state(flags, TEST_FPU)
+			else:
+				fpu = "none"
+			print("Processor %s (%s): CPU %s, FPU %s, memory %s (%sK), %.3fms" % (p.tpid, tpname(p.tptype), state(flags, TEST_CPU), fpu, state(flags, TEST_MEMORY), memory, elapsed / 1000.0))
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+################################################################
+#
+# server.py: A host file server for programs running on the
+# Transputer network, answering the standard iserver SP protocol
+# requests sent up the host link.
+#
+# Each request and reply is a 2 byte little-endian length followed
+# by that many bytes, the first of which is the command tag (or
+# result code in a reply). Packets are always an even number of
+# bytes, at least SP_MIN_PACKET and at most SP_MAX_PACKET long.
+#
+# The transputer can only ask for one packet's worth of data at a
+# time, so input files are memory-mapped (or read through a large
+# buffer if they can't be) and each SP_READ is served from memory.
+# Output files are written through a WRITEBEHIND_SIZE buffer which
+# is only flushed when it fills, or on SP_FLUSH, SP_CLOSE or SP_EXIT;
+# stdout and stderr are flushed before each read from stdin, so that
+# a prompt is always seen before the program waits for an answer.
+#
+# by John Snowdon (John.Snowdon@newcastle.ac.uk) 2016.
+#
+###############################################################
+
+# Basic Python modules
+import sys
+import os
+import time
+import mmap
+import struct
+
+# A python logging tool to debug text
+from libs.link_logger import link_logger
+# buffered, framed reads of iserver replies
+from libs.link_reader import LinkReader
+
+###############################################################
+
+# Packet sizes
+SP_MIN_PACKET = 8
+SP_MAX_PACKET = 512
+
+# Command tags
+SP_OPEN = 10
+SP_CLOSE = 11
+SP_READ = 12
+SP_WRITE = 13
+SP_FLUSH = 16
+SP_TIME = 33
+SP_EXIT = 35
+
+# Result codes
+SP_SUCCESS = 0
+SP_UNIMPLEMENTED = 1
+SP_ERROR = 129
+
+# Exit status values passed by SP_EXIT
+SP_EXIT_SUCCESS = 999999999
+SP_EXIT_FAILURE = -999999999
+
+# SP_OPEN modes
+SP_MODES = {
+	1 : "rb",
+	2 : "wb",
+	3 : "ab",
+	4 : "r+b",
+	5 : "w+b",
+	6 : "a+b",
+}
+
+# Buffer sizes for files which can't be memory-mapped, and for output
+READAHEAD_SIZE = 65536
+WRITEBEHIND_SIZE = 65536
+
+###############################################################
+
+class Stream():
+	""" A file opened on behalf of the transputer. Input files are
+	memory-mapped where possible so that reads never touch the disk
+	once the pages are in. """
+
+	def __init__(self, f = None, mapped = None, owned = True):
+		self.f = f
+		self.mapped = mapped
+		self.owned = owned
+		self.pos = 0
+
+	def read(self, count = 0):
+		if self.mapped is not None:
+			data = self.mapped[self.pos:self.pos + count]
+			self.pos += len(data)
+			return data
+		if not self.owned:
+			# stdin - return whatever is there rather than wait for 'count'
+			return os.read(self.f.fileno(), count)
+		return self.f.read(count)
+
+	def write(self, data = None):
+		if self.mapped is not None:
+			raise IOError("Stream is read only")
+		self.f.write(data)
+		return len(data)
+
+	def flush(self):
+		if self.mapped is None:
+			self.f.flush()
+
+	def close(self):
+		if self.mapped is not None:
+			self.mapped.close()
+		if self.owned:
+			self.f.close()
+		else:
+			self.f.flush()
+
+###############################################################
+
+class HostServer():
+	""" Services SP protocol requests from a program running on the root
+	transputer until it sends SP_EXIT. """
+
+	def __init__(self, link = None):
+		self.link = link
+		self.logger = link_logger(__name__, 'WARN')
+		if self.link.config["verbose"]:
+			self.logger = link_logger(__name__, 'INFO')
+		if self.link.config["vverbose"]:
+			self.logger = link_logger(__name__, 'DEBUG')
+		self.reader = LinkReader(self.link)
+		self.streams = {
+			0 : Stream(f = getattr(sys.stdin, "buffer", sys.stdin), owned = False),
+			1 : Stream(f = getattr(sys.stdout, "buffer", sys.stdout), owned = False),
+			2 : Stream(f = getattr(sys.stderr, "buffer", sys.stderr), owned = False),
+		}
+		self.next_stream = 3
+		self.status = None
+		self.handlers = {
+			SP_OPEN : self.sp_open,
+			SP_CLOSE : self.sp_close,
+			SP_READ : self.sp_read,
+			SP_WRITE : self.sp_write,
+			SP_FLUSH : self.sp_flush,
+			SP_TIME : self.sp_time,
+			SP_EXIT : self.sp_exit,
+		}
+
+	################################################################
+
+	def reply(self, payload = None):
+		""" Send a reply packet, padded to an even length of at least
+		SP_MIN_PACKET bytes. """
+		length = max(len(payload) + (len(payload) & 1), SP_MIN_PACKET)
+		packet = bytearray(struct.pack("<H", length)) + payload + bytearray(length - len(payload))
+		return self.link.WriteLink(bytes = packet, count = len(packet)) == len(packet)
+
+	def flush(self, streamids = None):
+		""" Push out any buffered output on the given streams, or on
+		every stream if none are given. """
+		if streamids is None:
+			streamids = list(self.streams.keys())
+		for streamid in streamids:
+			stream = self.streams.get(streamid)
+			if (stream is not None) and (stream.mapped is None):
+				try:
+					stream.flush()
+				except Exception as e:
+					self.logger.warn("Error flushing output: %s" % e)
+
+	################################################################
+
+	def sp_open(self, request = None):
+		namelen = struct.unpack_from("<H", request, 1)[0]
+		name = request[3:3 + namelen].tobytes()
+		filetype, mode = struct.unpack_from("<BB", request, 3 + namelen)
+		self.logger.info("SP_OPEN %s mode %s" % (name, mode))
+		if mode not in SP_MODES:
+			return bytearray([ SP_ERROR ])
+		try:
+			if mode == 1:
+				f = open(name, "rb", READAHEAD_SIZE)
+				stream = Stream(f = f)
+				try:
+					stream.mapped = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+				except (ValueError, mmap.error, EnvironmentError):
+					# Empty, or not a regular file - fall back to buffered reads
+					pass
+			else:
+				stream = Stream(f = open(name, SP_MODES[mode], WRITEBEHIND_SIZE))
+		except EnvironmentError as e:
+			self.logger.warn("SP_OPEN %s failed: %s" % (name, e))
+			return bytearray([ SP_ERROR ])
+		streamid = self.next_stream
+		self.next_stream += 1
+		self.streams[streamid] = stream
+		return bytearray(struct.pack("<Bi", SP_SUCCESS, streamid))
+
+	def sp_close(self, request = None):
+		streamid = struct.unpack_from("<i", request, 1)[0]
+		stream = self.streams.pop(streamid, None)
+		if stream is None:
+			return bytearray([ SP_ERROR ])
+		try:
+			stream.close()
+		except EnvironmentError as e:
+			self.logger.warn("SP_CLOSE %s failed: %s" % (streamid, e))
+			return bytearray([ SP_ERROR ])
+		return bytearray([ SP_SUCCESS ])
+
+	def sp_read(self, request = None):
+		streamid, count = struct.unpack_from("<iH", request, 1)
+		stream = self.streams.get(streamid)
+		if stream is None:
+			return bytearray([ SP_ERROR ])
+		if streamid == 0:
+			# Anything the user is waiting to see should be out before we block
+			self.flush(streamids = [ 1, 2 ])
+		count = min(count, SP_MAX_PACKET - 3)
+		try:
+			data = stream.read(count)
+		except EnvironmentError as e:
+			self.logger.warn("SP_READ %s failed: %s" % (streamid, e))
+			return bytearray([ SP_ERROR ])
+		return bytearray(struct.pack("<BH", SP_SUCCESS, len(data))) + data
+
+	def sp_write(self, request = None):
+		streamid, count = struct.unpack_from("<iH", request, 1)
+		stream = self.streams.get(streamid)
+		if stream is None:
+			return bytearray([ SP_ERROR ])
+		try:
+			written = stream.write(request[7:7 + count].tobytes())
+		except EnvironmentError as e:
+			self.logger.warn("SP_WRITE %s failed: %s" % (streamid, e))
+			return bytearray([ SP_ERROR ])
+		return bytearray(struct.pack("<BH", SP_SUCCESS, written))
+
+	def sp_flush(self, request = None):
+		streamid = struct.unpack_from("<i", request, 1)[0]
+		stream = self.streams.get(streamid)
+		if stream is None:
+			return bytearray([ SP_ERROR ])
+		stream.flush()
+		return bytearray([ SP_SUCCESS ])
+
+	def sp_time(self, request = None):
+		now = int(time.time())
+		local = now - time.altzone if time.localtime(now).tm_isdst else now - time.timezone
+		return bytearray(struct.pack("<BII", SP_SUCCESS, local & 0xFFFFFFFF, now & 0xFFFFFFFF))
+
+	def sp_exit(self, request = None):
+		self.status = struct.unpack_from("<i", request, 1)[0]
+		self.logger.info("SP_EXIT %s" % self.status)
+		self.flush()
+		return bytearray([ SP_SUCCESS ])
+
+	################################################################
+
+	def serve(self):
+		""" Answer requests until the transputer program exits. Returns
+		the exit status to hand back to the shell. """
+
+		while self.status is None:
+			dropped = self.reader.dropped
+			request = self.reader.read_frame(maxlength = SP_MAX_PACKET, expect = SP_MIN_PACKET)
+			if request is None:
+				if self.reader.dropped != dropped:
+					self.logger.fatal("Bad SP packet, longer than %s bytes" % SP_MAX_PACKET)
+					self.status = SP_EXIT_FAILURE
+				continue
+			if len(request) == 0:
+				continue
+
+			tag = bytearray(request[0:1])[0]
+			handler = self.handlers.get(tag)
+			if handler is None:
+				self.logger.debug("Unimplemented SP request %s" % tag)
+				result = bytearray([ SP_UNIMPLEMENTED ])
+			else:
+				try:
+					result = handler(request)
+				except struct.error as e:
+					self.logger.warn("Malformed SP request %s: %s" % (tag, e))
+					result = bytearray([ SP_ERROR ])
+			if not self.reply(payload = result):
+				self.logger.fatal("Unable to send SP reply")
+				self.status = SP_EXIT_FAILURE
+
+		for streamid in list(self.streams.keys()):
+			self.streams.pop(streamid).close()
+
+		if self.status == SP_EXIT_SUCCESS:
+			return 0
+		if self.status == SP_EXIT_FAILURE:
+			return 1
+		return self.status
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+################################################################
+#
+# watch.py: Periodic, low-traffic re-checking of a network which
+# has already been mapped by check.py.
+#
+# Rather than re-run the whole worm, each known processor is sent
+# a tiny TAG_TEST16/TAG_TEST32 echo along its cached route, and
+# only the differences from the previous pass are reported.
+#
+# by John Snowdon (John.Snowdon@newcastle.ac.uk) 2016.
+#
+###############################################################
+
+# Basic Python modules
+import time
+
+# more defines about particular hardware types
+import libs.link_hardware as link_hardware
+from pyspy.check import EVENT_PROCESSOR, EVENT_LINK, EVENT_LOST, EVENT_FOUND, EVENT_DRIFT
+
+# Fractional change in echo round trip time which is reported as drift
+DRIFT = 0.25
+
+# Echo round trip times, one per pass, whose median is compared with the
+# baseline. A single round trip of a few bytes is mostly host and driver
+# latency, so one sample on its own says little about the route.
+DRIFT_SAMPLES = 5
+
+# Passes between looks for new processors on free links. Each empty
+# link costs a boot string and a read timeout, far more than an echo.
+SCAN_EVERY = 10
+
+###############################################################
+
+class Watch():
+	""" Re-probes the processors found by a Check instance at a fixed
+	interval, reporting lost processors, new processors and drift in the
+	echo round trip time to each one. """
+
+	def __init__(self, checker = None, drift = DRIFT, scan = SCAN_EVERY):
+		self.checker = checker
+		self.logger = checker.logger
+		self.drift = drift
+		self.scan = scan
+		self.passes = 0
+		self.alive = {}
+		self.rtt = {}
+		self.samples = {}
+		for p in self.checker.processors:
+			self.alive[p.tpid] = True
+
+	def poll(self):
+		""" Generator which makes one pass over the network, yielding:
+
+			(EVENT_LOST, p)
+			(EVENT_FOUND, p)
+			(EVENT_DRIFT, p, old, new)
+
+		for every change since the last pass, where old and new are median
+		echo round trip times in seconds over the last DRIFT_SAMPLES
+		passes; the first full set of samples is the baseline, and it
+		moves each time drift is reported. Processors behind a lost one
+		are not probed, and are reported as lost along with it. Free
+		links are only probed for new processors every self.scan passes,
+		or never if it is 0. """
+
+		self.passes += 1
+
+		for p in list(self.checker.processors):
+			if p.tptype == link_hardware.C4:
+				continue
+			if p.parent and not self.alive[p.parent.tpid]:
+				rtt = False
+			else:
+				rtt = self.checker.ping(processor = p)
+
+			if rtt is False:
+				self.samples[p.tpid] = []
+				if self.alive[p.tpid]:
+					self.alive[p.tpid] = False
+					yield (EVENT_LOST, p)
+				continue
+
+			if not self.alive[p.tpid]:
+				self.alive[p.tpid] = True
+				yield (EVENT_FOUND, p)
+
+			samples = self.samples.setdefault(p.tpid, [])
+			samples.append(rtt)
+			if len(samples) < DRIFT_SAMPLES:
+				continue
+			del samples[:-DRIFT_SAMPLES]
+			rtt = sorted(samples)[DRIFT_SAMPLES // 2]
+			old = self.rtt.get(p.tpid)
+			if old is None:
+				self.rtt[p.tpid] = rtt
+			elif abs(rtt - old) > (old * self.drift):
+				self.rtt[p.tpid] = rtt
+				yield (EVENT_DRIFT, p, old, rtt)
+
+		# Anything plugged in to a free link since the last scan
+		if (not self.scan) or (self.passes % self.scan):
+			return
+		for p in list(self.checker.processors):
+			if (p.tptype == link_hardware.C4) or not self.alive[p.tpid]:
+				continue
+			for child in self.checker.neighbours(processor = p):
+				child.tpid = len(self.checker.processors)
+				self.checker.processors.append(child)
+				if (child.tptype != link_hardware.C4) and (self.checker.examine(processor = child) is False):
+					self.checker.processors.remove(child)
+					p.links[str(child.route)] = False
+					continue
+				self.alive[child.tpid] = True
+				yield (EVENT_FOUND, child)
+				yield (EVENT_PROCESSOR, child)
+				yield (EVENT_LINK, p, child.route, child, child.bootlink)
+
+	def run(self, interval = 60):
+		""" Poll the network every 'interval' seconds until interrupted,
+		passing each change to the checker's output writers, or printing
+		it if there are none. """
+
+		while True:
+			time.sleep(interval)
+			self.logger.info("Re-probing %s processors" % len(self.checker.processors))
+			for event in self.poll():
+				if self.checker.outputs:
+					for output in self.checker.outputs:
+						output.event(event)
+				elif event[0] == EVENT_LOST:
+					print("Lost processor %s" % event[1])
+				elif event[0] == EVENT_FOUND:
+					print("Found processor %s" % event[1])
+				elif event[0] == EVENT_DRIFT:
+					print("Round trip drift to processor %s: median %.6fs -> %.6fs" % (event[1].tpid, event[2], event[3]))